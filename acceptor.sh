@@ -1,3 +1,3 @@
 #!/usr/bin/env bash
 
-python3 paxos/main.py "$2" acceptor "$1"
+"${PYTHON:-python3}" paxos/main.py "$2" acceptor "$1"
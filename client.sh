@@ -1,2 +1,2 @@
 #!/usr/bin/env bash
-python3 paxos/main.py "$2" client "$1"
\ No newline at end of file
+"${PYTHON:-python3}" paxos/main.py "$2" client "$1"
\ No newline at end of file
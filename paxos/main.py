@@ -11,8 +11,11 @@ from roles.proposer import proposer
 from roles.learner import learner
 from roles.client import client
 
+# Per-message debug records are skipped entirely unless PAXOS_DEBUG=1. The level is
+# fixed at startup, so each role reads it once into a `debug` flag and guards its
+# per-message records with that instead of formatting them on every message
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=logging.DEBUG if os.environ.get("PAXOS_DEBUG") == "1" else logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     datefmt='%H:%M:%S'
 )
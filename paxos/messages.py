@@ -1,69 +1,210 @@
-import json
-import logging
+import struct
+
+# Message type tags, carried in the first byte of every datagram
+PHASE1A = 1
+PHASE1B = 2
+PHASE2A = 3
+PHASE2B = 4
+DECISION = 5
+PROPOSE = 6
+CATCHUP = 7
+BUNDLE = 8
+
+# Fixed-size headers; a message's value, if any, is the rest of the datagram, so
+# decoding it is a single slice. Only CATCHUP, which carries many values, prefixes
+# each one with its length. Rounds travel packed into a single integer, see pack_round()
+_PHASE1A = struct.Struct("!Bqqq")     # type, c_rnd, slot, client_id
+_PHASE1B = struct.Struct("!BqqqqH")   # type, rnd, v_rnd, slot, client_id, acceptor_id
+_PHASE2A = struct.Struct("!Bqqq")     # type, c_rnd, slot, client_id
+_PHASE2B = struct.Struct("!BqqqH")    # type, v_rnd, slot, client_id, acceptor_id
+_DECISION = struct.Struct("!Bq")      # type, slot
+_PROPOSE = struct.Struct("!Bq")       # type, client_id
+_CATCHUP = struct.Struct("!BI")       # type, number of (slot, value) records
+_BUNDLE = struct.Struct("!BH")        # type, number of length-prefixed messages
+_SLOT = struct.Struct("!q")
+_VALUE_LEN = struct.Struct("!H")
+NO_VALUE = 0xFFFF
+CATCHUP_MAX_SIZE = 60000  # keeps each CATCHUP under the 65507-byte UDP payload limit
+BUNDLE_MAX_SIZE = 1400  # fits one Ethernet frame, so bundles are never IP-fragmented
+
+def dispatch_table(handlers):
+    # Tuple indexed by the type byte, so dispatch is data[0] subscripting with no
+    # hashing; unknown types map to None
+    table = [None] * 256
+    for tag, handler in handlers.items():
+        table[tag] = handler
+    return tuple(table)
+
+def dispatch(handlers, data, logger):
+    # Hand one message to its handler from dispatch_table(); a bad datagram is logged
+    # and skipped so the rest of its batch is still handled
+    try:
+        handler = handlers[data[0]]
+        if handler is not None:
+            handler(data)
+    except Exception as e:
+        logger.error(f"Error handling message: {e}", exc_info=True)
+
+def pack_round(counter, proposer_id):
+    # (counter, id) pairs order the same as their packed form, so rounds
+    # compare and hash as plain ints. 0 means "no round".
+    return (counter << 32) | proposer_id
+
+def _encode_value(value):
+    # Values stay bytes end to end, from the client's stdin to the learner's stdout.
+    # Length-prefixed form, used for CATCHUP records
+    if value is None:
+        return _VALUE_LEN.pack(NO_VALUE)
+    return _VALUE_LEN.pack(len(value)) + value
+
+def _decode_value(data, offset):
+    (length,) = _VALUE_LEN.unpack_from(data, offset)
+    offset += _VALUE_LEN.size
+    if length == NO_VALUE:
+        return None, offset
+    return data[offset:offset + length], offset + length
 
 def create_phase1a_message(c_rnd, instance, client_id):
-    msg = json.dumps({
-        "type": "PHASE1A",
-        "c_rnd_1": c_rnd[0],
-        "c_rnd_2": c_rnd[1],
-        "slot": instance,
-        "client_id": client_id
-    }).encode()
-    logging.debug(f"Created PHASE1A message: c_rnd={c_rnd}, instance={instance}, client_id={client_id}")
-    return msg
-
-def create_phase1b_message(rnd, v_rnd, v_val, instance, client_id):
-    msg = json.dumps({
-        "type": "PHASE1B",
-        "rnd_1": rnd[0],
-        "rnd_2": rnd[1],
-        "v_rnd_1": v_rnd[0] if v_rnd else None,
-        "v_rnd_2": v_rnd[1] if v_rnd else None,
-        "v_val": v_val,
-        "slot": instance,
-        "client_id": client_id
-    }).encode()
-    logging.debug(f"Created PHASE1B message: rnd={rnd}, v_rnd={v_rnd}, v_val={v_val}, instance={instance}")
-    return msg
+    return _PHASE1A.pack(PHASE1A, c_rnd, instance, client_id)
+
+def create_phase1b_message(rnd, v_rnd, v_val, instance, client_id, acceptor_id):
+    # v_rnd 0 means nothing accepted yet, and then there is no value to send
+    return _PHASE1B.pack(PHASE1B, rnd, v_rnd or 0, instance, client_id, acceptor_id) + (v_val or b"")
 
 def create_phase2a_message(c_rnd, c_val, instance, client_id):
-    msg = json.dumps({
-        "type": "PHASE2A",
-        "c_rnd_1": c_rnd[0],
-        "c_rnd_2": c_rnd[1],
-        "c_val": c_val,
-        "client_id": client_id,
-        "slot": instance
-    }).encode()
-    logging.debug(f"Created PHASE2A message: c_rnd={c_rnd}, c_val={c_val}, instance={instance}")
-    return msg
-
-def create_phase2b_message(v_rnd, v_val, instance, client_id):
-    msg = json.dumps({
-        "type": "PHASE2B",
-        "v_rnd_1": v_rnd[0],
-        "v_rnd_2": v_rnd[1],
-        "v_val": v_val,
-        "slot": instance,
-        "client_id": client_id,
-    }).encode()
-    logging.debug(f"Created PHASE2B message: v_rnd={v_rnd}, v_val={v_val}, instance={instance}")
-    return msg
+    return _PHASE2A.pack(PHASE2A, c_rnd, instance, client_id) + c_val
+
+def create_phase2b_message(v_rnd, v_val, instance, client_id, acceptor_id):
+    return _PHASE2B.pack(PHASE2B, v_rnd, instance, client_id, acceptor_id) + v_val
 
 def create_decision_message(v_val, instance):
-    msg = json.dumps({
-        "type": "DECISION",
-        "v_val": v_val,
-        "slot": instance
-    }).encode()
-    logging.debug(f"Created DECISION message: v_val={v_val}, instance={instance}")
-    return msg
-
-def create_propose_message(value, client_id):
-    msg = json.dumps({
-        "type": "PROPOSE",
-        "value": value,
-        "client_id": client_id
-    }).encode()
-    logging.debug(f"Created PROPOSE message: value={value}, client_id={client_id}")
-    return msg
\ No newline at end of file
+    return _DECISION.pack(DECISION, instance) + v_val
+
+def create_propose_header(client_id):
+    # Identical for every proposal of a client; a PROPOSE is this header plus the value
+    return _PROPOSE.pack(PROPOSE, client_id)
+
+def create_catchup_record(instance, value):
+    # One (slot, value) record of a CATCHUP message; decided values never change, so
+    # a record can be encoded once and reused in every later response
+    return _SLOT.pack(instance) + _encode_value(value)
+
+def _catchup_from_records(records):
+    return _CATCHUP.pack(CATCHUP, len(records)) + b"".join(records)
+
+def create_catchup_message(decisions=None):
+    decisions = decisions or {}
+    return _catchup_from_records([create_catchup_record(i, v) for i, v in decisions.items()])
+
+def create_catchup_messages(records):
+    # Join pre-encoded records (see create_catchup_record) into as many CATCHUP
+    # datagrams as CATCHUP_MAX_SIZE requires
+    messages = []
+    chunk = []
+    size = _CATCHUP.size
+    for record in records:
+        if chunk and size + len(record) > CATCHUP_MAX_SIZE:
+            messages.append(_catchup_from_records(chunk))
+            chunk = []
+            size = _CATCHUP.size
+        chunk.append(record)
+        size += len(record)
+    if chunk:
+        messages.append(_catchup_from_records(chunk))
+    return messages
+
+def _bundle(group):
+    if len(group) == 1:
+        return group[0]
+    parts = [_BUNDLE.pack(BUNDLE, len(group))]
+    for msg in group:
+        parts.append(_VALUE_LEN.pack(len(msg)))
+        parts.append(msg)
+    return b"".join(parts)
+
+def create_bundles(msgs):
+    # Coalesce consecutive messages into BUNDLE datagrams of at most BUNDLE_MAX_SIZE
+    # bytes; a message left on its own, or too big to share, goes out unwrapped
+    bundles = []
+    group = []
+    size = _BUNDLE.size
+    for msg in msgs:
+        record_size = _VALUE_LEN.size + len(msg)
+        if group and size + record_size > BUNDLE_MAX_SIZE:
+            bundles.append(_bundle(group))
+            group = []
+            size = _BUNDLE.size
+        group.append(msg)
+        size += record_size
+    if group:
+        bundles.append(_bundle(group))
+    return bundles
+
+def _unbundle_one(data):
+    # Messages of one BUNDLE datagram, or None if the frame is truncated or corrupt
+    if len(data) < _BUNDLE.size:
+        return None
+    _, count = _BUNDLE.unpack_from(data)
+    offset = _BUNDLE.size
+    messages = []
+    for _ in range(count):
+        if offset + _VALUE_LEN.size > len(data):
+            return None
+        (length,) = _VALUE_LEN.unpack_from(data, offset)
+        offset += _VALUE_LEN.size
+        if offset + length > len(data):
+            return None
+        messages.append(data[offset:offset + length])
+        offset += length
+    return messages
+
+def unbundle(datagrams):
+    # Expand BUNDLE datagrams into the messages they carry, keeping their order.
+    # Empty datagrams and malformed bundles are dropped, never raised on
+    messages = []
+    for data in datagrams:
+        if not data:
+            continue
+        if data[0] != BUNDLE:
+            messages.append(data)
+            continue
+        bundled = _unbundle_one(data)
+        if bundled is not None:
+            messages.extend(bundled)
+    return messages
+
+def parse_phase1a_message(data):
+    _, c_rnd, instance, client_id = _PHASE1A.unpack_from(data)
+    return c_rnd, instance, client_id
+
+def parse_phase1b_message(data):
+    _, rnd, v_rnd, instance, client_id, acceptor_id = _PHASE1B.unpack_from(data)
+    if not v_rnd:
+        return rnd, None, None, instance, client_id, acceptor_id
+    return rnd, v_rnd, data[_PHASE1B.size:], instance, client_id, acceptor_id
+
+def parse_phase2a_message(data):
+    _, c_rnd, instance, client_id = _PHASE2A.unpack_from(data)
+    return c_rnd, data[_PHASE2A.size:], instance, client_id
+
+def parse_phase2b_message(data):
+    _, v_rnd, instance, client_id, acceptor_id = _PHASE2B.unpack_from(data)
+    return v_rnd, data[_PHASE2B.size:], instance, client_id, acceptor_id
+
+def parse_decision_message(data):
+    _, instance = _DECISION.unpack_from(data)
+    return data[_DECISION.size:], instance
+
+def parse_propose_message(data):
+    _, client_id = _PROPOSE.unpack_from(data)
+    return data[_PROPOSE.size:], client_id
+
+def parse_catchup_message(data):
+    _, count = _CATCHUP.unpack_from(data)
+    offset = _CATCHUP.size
+    decisions = {}
+    for _ in range(count):
+        (instance,) = _SLOT.unpack_from(data, offset)
+        value, offset = _decode_value(data, offset + _SLOT.size)
+        decisions[instance] = value
+    return decisions
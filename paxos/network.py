@@ -1,29 +1,166 @@
 import socket
 import struct
-import math
 import logging
+import ctypes
+import ctypes.util
+import errno
+import os
+
+SOCKET_BUFFER_SIZE = 12 * 1024 * 1024  # matches net.core.rmem_max/wmem_max=12582912
+# Every role runs on one host in the test setup and must hear the others' sends, so
+# loopback stays on unless PAXOS_MCAST_LOOP=0 (roles spread over separate hosts)
+MCAST_LOOP = os.environ.get("PAXOS_MCAST_LOOP", "1") != "0"
+
+def set_buffer_size(sock, option, size=SOCKET_BUFFER_SIZE):
+    sock.setsockopt(socket.SOL_SOCKET, option, size)
+    # The kernel silently clamps the request at rmem_max/wmem_max
+    effective = sock.getsockopt(socket.SOL_SOCKET, option)
+    logging.debug(f"Requested socket buffer {size}, effective {effective}")
+    return effective
+
+RECV_BATCH = 64
+RECV_BUFFER_SIZE = 2**16
+MSG_WAITFORONE = 0x10000
+
+class _IoVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IoVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    _recvmmsg = _libc.recvmmsg
+    _recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    _recvmmsg.restype = ctypes.c_int
+except (OSError, AttributeError, TypeError):
+    _recvmmsg = None  # not Linux, fall back to one recv per datagram
+
+try:
+    _sendmmsg = _libc.sendmmsg
+    _sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    _sendmmsg.restype = ctypes.c_int
+except (NameError, AttributeError):
+    _sendmmsg = None  # fall back to one send per datagram
+
+_recv_batches = {}  # fd -> (buffer addresses, mmsghdr array, buffers kept alive)
+_recv_buffers = {}  # fd -> reusable buffer for the recv_into fallback
+
+def _recv_batch(fd):
+    batch = _recv_batches.get(fd)
+    if batch is None:
+        buffers = [ctypes.create_string_buffer(RECV_BUFFER_SIZE) for _ in range(RECV_BATCH)]
+        addresses = [ctypes.addressof(buf) for buf in buffers]
+        iovecs = (_IoVec * RECV_BATCH)()
+        msgs = (_MMsgHdr * RECV_BATCH)()
+        for i, address in enumerate(addresses):
+            iovecs[i].iov_base = address
+            iovecs[i].iov_len = RECV_BUFFER_SIZE
+            msgs[i].msg_hdr.msg_iov = ctypes.pointer(iovecs[i])
+            msgs[i].msg_hdr.msg_iovlen = 1
+        batch = _recv_batches[fd] = (addresses, msgs, (buffers, iovecs))
+    return batch
+
+def drain(sock):
+    """Return the datagrams queued on sock: up to RECV_BATCH of them from one
+    recvmmsg call where available, otherwise (recv_into fallback) a single one.
+
+    Blocks like recv() until at least one datagram is queued; on a non-blocking
+    socket with nothing queued, raises BlockingIOError.
+    """
+    if _recvmmsg is None:
+        # recv() would allocate a full RECV_BUFFER_SIZE bytes object per datagram;
+        # read into one reused buffer and copy out only what arrived
+        view = _recv_buffers.get(sock.fileno())
+        if view is None:
+            view = _recv_buffers[sock.fileno()] = memoryview(bytearray(RECV_BUFFER_SIZE))
+        n = sock.recv_into(view)
+        return [bytes(view[:n])]
+    fd = sock.fileno()
+    addresses, msgs, _ = _recv_batch(fd)
+    while True:
+        n = _recvmmsg(fd, msgs, RECV_BATCH, MSG_WAITFORONE, None)
+        if n >= 0:
+            return [ctypes.string_at(addresses[i], msgs[i].msg_len) for i in range(n)]
+        err = ctypes.get_errno()
+        if err == errno.EINTR:
+            continue
+        if err in (errno.EAGAIN, errno.EWOULDBLOCK):
+            raise BlockingIOError(err, os.strerror(err))
+        raise OSError(err, os.strerror(err))
+
+def send_batch(sock, msgs):
+    """Send every datagram in msgs on the connected sock, using one sendmmsg call where available."""
+    n = len(msgs)
+    if _sendmmsg is None or n < 2:
+        for msg in msgs:
+            sock.send(msg)
+        return
+    iovecs = (_IoVec * n)()
+    hdrs = (_MMsgHdr * n)()
+    for i, msg in enumerate(msgs):
+        # msgs holds the bytes objects alive until the call returns
+        iovecs[i].iov_base = ctypes.cast(msg, ctypes.c_void_p)
+        iovecs[i].iov_len = len(msg)
+        hdrs[i].msg_hdr.msg_iov = ctypes.pointer(iovecs[i])
+        hdrs[i].msg_hdr.msg_iovlen = 1
+    fd = sock.fileno()
+    sent = 0
+    while sent < n:
+        done = _sendmmsg(fd, ctypes.addressof(hdrs) + sent * ctypes.sizeof(_MMsgHdr), n - sent, 0)
+        if done >= 0:
+            sent += done
+            continue
+        err = ctypes.get_errno()
+        if err != errno.EINTR:
+            raise OSError(err, os.strerror(err))
 
 def mcast_receiver(hostport):
     recv_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
     recv_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    set_buffer_size(recv_sock, socket.SO_RCVBUF)
     recv_sock.bind(hostport)
     mcast_group = struct.pack("4sl", socket.inet_aton(hostport[0]), socket.INADDR_ANY)
     recv_sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mcast_group)
     return recv_sock
 
-def mcast_sender():
-    return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+def mcast_sender(hostport=None):
+    send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    set_buffer_size(send_sock, socket.SO_SNDBUF)
+    if not MCAST_LOOP:
+        # Skip the kernel copy looped back to local receivers
+        send_sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 0)
+    if hostport is not None:
+        # Fix the destination once so send() skips the per-call address conversion
+        send_sock.connect(hostport)
+    return send_sock
 
 def get_quorum(n_acceptors):
-    return math.ceil((n_acceptors + 1) / 2)
+    return n_acceptors // 2 + 1  # strict majority, integer-only
 
 def parse_cfg(cfgpath):
-    cfg = {}
-    acceptor_count = 0
+    # Cluster size for quorums; an optional "acceptor_count <n>" line overrides it
+    cfg = {'acceptor_count': 3}
     with open(cfgpath, "r") as cfgfile:
         for line in cfgfile:
-            (role, host, port) = line.split()
+            fields = line.split()
+            if not fields:
+                continue
+            if fields[0] == "acceptor_count":
+                cfg['acceptor_count'] = int(fields[1])
+                continue
+            (role, host, port) = fields
             cfg[role] = (host, int(port))
-    cfg['acceptor_count'] = 3  #hardcode
     logging.debug(f"Parsed config: {cfg}")
     return cfg
\ No newline at end of file
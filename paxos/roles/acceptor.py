@@ -1,84 +1,123 @@
-import json
 import logging
 from collections import defaultdict
-from messages import create_phase1b_message, create_phase2b_message
-from network import mcast_receiver, mcast_sender
+from typing import Optional
+from messages import (
+    PHASE1A, PHASE2A, DECISION, CATCHUP,
+    dispatch_table, dispatch, create_bundles, unbundle,
+    create_phase1b_message, create_phase2b_message, create_catchup_record, create_catchup_messages,
+    parse_phase1a_message, parse_phase2a_message, parse_decision_message
+)
+from network import mcast_receiver, mcast_sender, drain, send_batch
 
-def acceptor(config, id):
+class AcceptorState:
+    __slots__ = ("rnd", "v_rnd", "v_val")
+    
+    def __init__(self):
+        self.rnd = 0    # packed rounds, see messages.pack_round
+        self.v_rnd = 0
+        self.v_val: Optional[bytes] = None
+    
+    def __repr__(self):
+        return f"AcceptorState(rnd={self.rnd}, v_rnd={self.v_rnd}, v_val={self.v_val})"
+
+def acceptor(config: dict, id: int) -> None:
     logger = logging.getLogger(f"Acceptor-{id}")
+    debug = logger.isEnabledFor(logging.DEBUG)
     logger.info(f"[{id}] started")
     
-    acceptor_states = defaultdict(lambda: {
-        "rnd": (0, 0),        
-        "v_rnd": (0, 0),      
-        "v_val": None         
-    })
-    decisions = {}
+    acceptor_states = defaultdict(AcceptorState)
+    decisions = {}  # instance -> encoded CATCHUP record, from the proposers' DECISION messages
+    catchup_response = None  # encoded decisions, rebuilt only after a new one arrives
     r = mcast_receiver(config["acceptors"])
-    s = mcast_sender()
+    s_proposers = mcast_sender(config["proposers"])
+    s_learners = mcast_sender(config["learners"])
+    to_proposers = []  # replies queued during a drain batch, sent together after it
+    reply = to_proposers.append
+    
+    def handle_phase1a(data):
+        c_rnd, instance, client_id = parse_phase1a_message(data)
+        state = acceptor_states[instance]
+        if debug:
+            logger.debug("[%s] Received PHASE1A: instance=%s, client_id=%s", id, instance, client_id)
+            logger.debug("[%s] PHASE1A - Current state for instance %s: %s", id, instance, state)
+        
+        # Accept prepare if round number is higher than any we've seen
+        if c_rnd > state.rnd:
+            if debug:
+                logger.debug("[%s] Accepting PHASE1A: c_rnd %s > current rnd %s", id, c_rnd, state.rnd)
+            state.rnd = c_rnd
+            phase1b = create_phase1b_message(
+                rnd=state.rnd,
+                v_rnd=state.v_rnd if state.v_val is not None else None,
+                v_val=state.v_val,
+                instance=instance,
+                client_id=client_id,
+                acceptor_id=id
+            )
+            reply(phase1b)
+        else:
+            if debug:
+                logger.debug("[%s] Rejecting PHASE1A: c_rnd %s <= current rnd %s", id, c_rnd, state.rnd)
+    
+    def handle_phase2a(data):
+        c_rnd, c_val, instance, client_id = parse_phase2a_message(data)
+        state = acceptor_states[instance]
+        if debug:
+            logger.debug("[%s] Received PHASE2A: instance=%s, client_id=%s", id, instance, client_id)
+            logger.debug("[%s] PHASE2A - Current state for instance %s: %s", id, instance, state)
+        
+        # Accept only if round number is >= highest prepare round seen
+        if c_rnd >= state.rnd:
+            if debug:
+                logger.debug("[%s] Accepting PHASE2A: c_rnd %s >= current rnd %s", id, c_rnd, state.rnd)
+            state.rnd = c_rnd
+            state.v_rnd = c_rnd
+            state.v_val = c_val
+            
+            phase2b = create_phase2b_message(
+                v_rnd=state.v_rnd,
+                v_val=state.v_val,
+                instance=instance,
+                client_id=client_id,
+                acceptor_id=id
+            )
+            reply(phase2b)
+        else:
+            if debug:
+                logger.debug("[%s] Rejecting PHASE2A: c_rnd %s < current rnd %s", id, c_rnd, state.rnd)
+    
+    def handle_decision(data):
+        nonlocal catchup_response
+        value, instance = parse_decision_message(data)
+        if instance not in decisions:
+            decisions[instance] = create_catchup_record(instance, value)
+            catchup_response = None
+    
+    def handle_catchup(data):
+        nonlocal catchup_response
+        if debug:
+            logger.debug("[%s] Sending CATCHUP response with %s decisions", id, len(decisions))
+        if catchup_response is None:
+            catchup_response = create_catchup_messages(decisions.values())
+        send_batch(s_learners, catchup_response)
+    
+    handlers = dispatch_table({
+        PHASE1A: handle_phase1a,
+        PHASE2A: handle_phase2a,
+        DECISION: handle_decision,
+        CATCHUP: handle_catchup
+    })
     
     while True:
         try:
-            data = r.recv(2**16)
-            msg = json.loads(data.decode())
-            msg_type = msg["type"]
-            instance = msg.get("slot")
-            client_id = msg.get("client_id")
+            try:
+                for data in unbundle(drain(r)):
+                    dispatch(handlers, data, logger)
+            finally:
+                # Replies queued so far go out even if the batch was cut short
+                outgoing = create_bundles(to_proposers)
+                to_proposers.clear()
+                send_batch(s_proposers, outgoing)
             
-            logger.debug(f"[{id}] Received message: type={msg_type}, instance={instance}, client_id={client_id}")
-            
-            if msg_type == "PHASE1A":
-                c_rnd = (msg["c_rnd_1"], msg["c_rnd_2"])
-                state = acceptor_states[instance]
-                
-                logger.debug(f"[{id}] PHASE1A - Current state for instance {instance}: {state}")
-                
-                # Accept prepare if round number is higher than any we've seen
-                if c_rnd > state["rnd"]:
-                    logger.debug(f"[{id}] Accepting PHASE1A: c_rnd {c_rnd} > current rnd {state['rnd']}")
-                    state["rnd"] = c_rnd
-                    phase1b = create_phase1b_message(
-                        rnd=state["rnd"],
-                        v_rnd=state["v_rnd"] if state["v_val"] is not None else None,
-                        v_val=state["v_val"],
-                        instance=instance,
-                        client_id=client_id
-                    )
-                    s.sendto(phase1b, config["proposers"])
-                else:
-                    logger.debug(f"[{id}] Rejecting PHASE1A: c_rnd {c_rnd} <= current rnd {state['rnd']}")
-            
-            elif msg_type == "PHASE2A":
-                c_rnd = (msg["c_rnd_1"], msg["c_rnd_2"])
-                c_val = msg["c_val"]
-                state = acceptor_states[instance]
-                
-                logger.debug(f"[{id}] PHASE2A - Current state for instance {instance}: {state}")
-                
-                # Accept only if round number is >= highest prepare round seen
-                if c_rnd >= state["rnd"]:
-                    logger.debug(f"[{id}] Accepting PHASE2A: c_rnd {c_rnd} >= current rnd {state['rnd']}")
-                    state["rnd"] = c_rnd
-                    state["v_rnd"] = c_rnd
-                    state["v_val"] = c_val
-                    
-                    phase2b = create_phase2b_message(
-                        v_rnd=state["v_rnd"],
-                        v_val=state["v_val"],
-                        instance=instance,
-                        client_id=client_id
-                    )
-                    s.sendto(phase2b, config["proposers"])
-                else:
-                    logger.debug(f"[{id}] Rejecting PHASE2A: c_rnd {c_rnd} < current rnd {state['rnd']}")
-            
-            elif msg_type == "CATCHUP":
-                logger.debug(f"[{id}] Sending CATCHUP response with decisions: {decisions}")
-                catchup_response = {
-                    "type": "CATCHUP",
-                    "decided": decisions
-                }
-                s.sendto(json.dumps(catchup_response).encode(), config["learners"])
-        
         except Exception as e:
             logger.error(f"[{id}] Error: {e}", exc_info=True)
\ No newline at end of file
@@ -1,19 +1,20 @@
-import json
 import logging
 import sys
 import time
-from messages import create_propose_message
+from messages import create_propose_header
 from network import mcast_sender
 
-def client(config, id):
+def client(config: dict, id: int) -> None:
     logger = logging.getLogger(f"Client-{id}")
+    debug = logger.isEnabledFor(logging.DEBUG)
     logger.info(f"Starting client {id}")
-    s = mcast_sender()
+    s = mcast_sender(config["proposers"])
+    header = create_propose_header(id)
     
-    for value in sys.stdin:
+    for value in sys.stdin.buffer:
         value = value.strip()
-        proposal = create_propose_message(value, id)
-        s.sendto(proposal, config["proposers"])
-        logger.debug(f"Sent proposal with value: {value}")
+        s.send(header + value)
+        if debug:
+            logger.debug("Sent proposal with value: %s", value)
     
     logger.info(f"Client {id} finished")
\ No newline at end of file
@@ -1,87 +1,111 @@
-import json
 import logging
+import selectors
+import signal
 import sys
 import time
-from collections import defaultdict
-from messages import create_decision_message
-from network import mcast_receiver, mcast_sender
+from messages import (
+    DECISION, CATCHUP,
+    dispatch_table, dispatch, unbundle,
+    create_catchup_message,
+    parse_decision_message, parse_catchup_message
+)
+from network import mcast_receiver, mcast_sender, drain
 
-def learner(config, id):
+def learner(config: dict, id: int) -> None:
     logger = logging.getLogger(f"Learner-{id}")
+    debug = logger.isEnabledFor(logging.DEBUG)
     logger.info(f"[{id}] started")
     
+    # stdout is flushed once per received batch rather than per value; the SIGTERM
+    # sent by the test scripts becomes a normal exit
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
     r = mcast_receiver(config["learners"])
     r.setblocking(False)
-    s = mcast_sender()
+    selector = selectors.DefaultSelector()  # epoll on Linux
+    selector.register(r, selectors.EVENT_READ)
+    s = mcast_sender(config["acceptors"])
     
     # State tracking
     decisions = {}  # instance -> value
-    decision_counts = defaultdict(int)
+    max_instance = -1  # highest instance in decisions, kept up to date on insert
     next_to_print = 0
     requested_instances = set()
     start_time = float("inf")
+    gap_check_pending = False  # a decision arrived since the last gap check
     CATCHUP_TIMEOUT = 3
+    write = sys.stdout.buffer.write
+    flush = sys.stdout.buffer.flush
     
     # Send initial catchup request
-    catchup_request = json.dumps({"type": "CATCHUP"}).encode()
-    s.sendto(catchup_request, config["acceptors"])
+    catchup_request = create_catchup_message()
+    s.send(catchup_request)
     logger.info(f"[{id}] Sent initial CATCHUP request")
     
+    def handle_decision(data):
+        nonlocal next_to_print, start_time, max_instance, gap_check_pending
+        value, instance = parse_decision_message(data)
+        
+        if instance not in decisions:
+            decisions[instance] = value
+            if instance > max_instance:
+                max_instance = instance
+        elif decisions[instance] != value:
+            # Check for conflicting decisions
+            logger.error(f"[{id}] Conflicting decisions for instance {instance}: {decisions[instance]} vs {value}")
+        
+        start_time = time.monotonic()
+        gap_check_pending = True
+        
+        # Print decisions in order
+        while next_to_print in decisions:
+            write(decisions[next_to_print] + b"\n")
+            next_to_print += 1
+        
+        if debug:
+            logger.debug("[%s] Learned decision for instance %s: %s", id, instance, value)
+    
+    def handle_catchup(data):
+        nonlocal next_to_print, max_instance
+        catchup_data = parse_catchup_message(data)
+        for instance, value in catchup_data.items():
+            if instance not in decisions:
+                decisions[instance] = value
+                if instance > max_instance:
+                    max_instance = instance
+            elif decisions[instance] != value:
+                logger.error(f"[{id}] Conflicting catchup decisions for instance {instance}")
+        
+        # Print any newly learned decisions
+        while next_to_print in decisions:
+            write(decisions[next_to_print] + b"\n")
+            next_to_print += 1
+        
+        if debug:
+            logger.debug("[%s] Processed catchup data for %s decisions", id, len(catchup_data))
+    
+    handlers = dispatch_table({
+        DECISION: handle_decision,
+        CATCHUP: handle_catchup
+    })
+    
     while True:
+        # Sleep until a datagram arrives or a pending gap check is due; with no
+        # check pending, nothing can change until the next datagram
+        timeout = max(0.0, start_time + CATCHUP_TIMEOUT - time.monotonic()) if gap_check_pending else None
         try:
-            data = r.recv(2**16)
-            msg = json.loads(data.decode())
-            msg_type = msg["type"]
+            ready = selector.select(timeout)
+            if ready:
+                for data in unbundle(drain(r)):
+                    dispatch(handlers, data, logger)
+                # One syscall for everything the batch printed, and nothing learned
+                # waits in the buffer for the next datagram
+                flush()
             
-            if msg_type == "DECISION":
-                instance = msg["slot"]
-                value = msg["v_val"]
-                
-                if instance not in decisions:
-                    decisions[instance] = value
-                    decision_counts[instance] = 1
-                else:
-                    # Check for conflicting decisions
-                    if decisions[instance] != value:
-                        logger.error(f"[{id}] Conflicting decisions for instance {instance}: {decisions[instance]} vs {value}")
-                    decision_counts[instance] += 1
-                
-                start_time = time.time()
-                
-                # Print decisions in order
-                while next_to_print in decisions:
-                    print(f"{decisions[next_to_print]}")
-                    sys.stdout.flush()
-                    next_to_print += 1
-                
-                logger.debug(f"[{id}] Learned decision for instance {instance}: {value}")
-            
-            elif msg_type == "CATCHUP":
-                catchup_data = msg.get("decided", {})
-                for slot_str, value in catchup_data.items():
-                    instance = int(slot_str)
-                    if instance not in decisions:
-                        decisions[instance] = value
-                        decision_counts[instance] = 1
-                    else:
-                        if decisions[instance] != value:
-                            logger.error(f"[{id}] Conflicting catchup decisions for instance {instance}")
-                        decision_counts[instance] += 1
-                
-                # Print any newly learned decisions
-                while next_to_print in decisions:
-                    print(f"{decisions[next_to_print]}")
-                    sys.stdout.flush()
-                    next_to_print += 1
-                
-                logger.debug(f"[{id}] Processed catchup data for {len(catchup_data)} decisions")
-        
-        except BlockingIOError:
-            # Handle catchup for missing instances
-            now = time.time()
-            if now - start_time > CATCHUP_TIMEOUT:
+            elif gap_check_pending:
+                # Handle catchup for missing instances
+                gap_check_pending = False
                 if decisions:
-                    max_instance = max(decisions.keys())
                     missing_instances = []
                     
                     # Check for missing instances
@@ -91,9 +115,12 @@ def learner(config, id):
                     
                     if missing_instances:
                         requested_instances.update(missing_instances)
-                        catchup_request = create_decision_message(None, missing_instances[0])
-                        s.sendto(catchup_request, config["acceptors"])
-                        logger.debug(f"[{id}] Requesting catchup for instances: {missing_instances}")
+                        s.send(catchup_request)
+                        if debug:
+                            logger.debug("[%s] Requesting catchup for instances: %s", id, missing_instances)
+        
+        except BlockingIOError:
+            pass  # spurious wakeup, nothing queued after all
         
         except Exception as e:
             logger.error(f"[{id}] Error: {e}", exc_info=True)
\ No newline at end of file
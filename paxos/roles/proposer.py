@@ -1,113 +1,181 @@
-import json
+import heapq
 import logging
-import time
-import math
 import random
-from collections import defaultdict
-from messages import create_phase1a_message, create_phase2a_message, create_decision_message
-from network import mcast_receiver, mcast_sender, get_quorum
+import selectors
+import time
+from collections import deque
+from typing import Optional
+from messages import (
+    PROPOSE, PHASE1B, PHASE2B,
+    dispatch_table, dispatch, create_bundles, unbundle,
+    pack_round, create_phase1a_message, create_phase2a_message, create_decision_message,
+    parse_propose_message, parse_phase1b_message, parse_phase2b_message
+)
+from network import mcast_receiver, mcast_sender, drain, send_batch, get_quorum
+
+class Proposal:
+    __slots__ = ("c_rnd", "c_val", "promised", "best_rnd", "best_val", "phase1_done", "accepted", "deadline")
+    
+    def __init__(self, c_val: Optional[bytes]) -> None:
+        self.c_rnd = 0  # packed round, see messages.pack_round
+        self.c_val = c_val
+        self.accepted = 0  # bitmask of acceptor ids that acked c_rnd; acks all carry c_val
+        self.deadline = 0.0
+        self.reset_promises()
+    
+    def reset_promises(self) -> None:
+        # Promises are folded in as they arrive: a bitmask of the acceptor ids heard from,
+        # so a duplicated reply is not counted twice, plus the highest accepted value so far
+        self.promised = 0
+        self.best_rnd: Optional[int] = None
+        self.best_val: Optional[bytes] = None
+        self.phase1_done = False
 
-def proposer(config, id):
+def proposer(config: dict, id: int) -> None:
     logger = logging.getLogger(f"Proposer-{id}")
+    debug = logger.isEnabledFor(logging.DEBUG)
     logger.info(f"[{id}] started")
     
     r = mcast_receiver(config["proposers"])
     r.setblocking(False)
-    s = mcast_sender()
+    selector = selectors.DefaultSelector()  # epoll on Linux
+    selector.register(r, selectors.EVENT_READ)
+    s_acceptors = mcast_sender(config["acceptors"])
+    s_learners = mcast_sender(config["learners"])
     
     TOTAL_ACCEPTORS = config['acceptor_count']
-    QUORUM_SIZE = math.ceil(TOTAL_ACCEPTORS / 2)
+    QUORUM_SIZE = get_quorum(TOTAL_ACCEPTORS)  # majority, computed once
+    MAX_PIPELINE_DEPTH = 64  # instances in flight at once; later values wait in backlog
     
     # State tracking
     rnd_counter = 0
     next_instance = 0  # Track next available instance
-    c_rnd = {}  # Map instance to round number
-    c_val = {}  # Map instance to proposed value
-    promises = defaultdict(list)  # Map instance to list of promises
-    accepts = defaultdict(list)  # Map instance to list of accepts
-    pending = {}  # Map instance to timestamp
+    proposals = {}  # Map instance to its in-flight Proposal
+    backlog = deque()  # client values waiting for a free pipeline slot
+    retry_heap = []  # (deadline, instance) min-heap of Phase 1 retries
+    # Messages queued during one loop iteration, sent together at its end
+    to_acceptors = []
+    to_learners = []
+    queue_acceptors = to_acceptors.append
+    queue_learners = to_learners.append
+    now = time.monotonic()  # read once per loop iteration, after select returns
     
     def start_phase1(instance, value):
         nonlocal rnd_counter
         rnd_counter += 1
-        new_rnd = (rnd_counter, id)
-        c_rnd[instance] = new_rnd
-        c_val[instance] = value
+        new_rnd = pack_round(rnd_counter, id)
+        proposal = proposals.get(instance)
+        if proposal is None:
+            proposal = proposals[instance] = Proposal(value)
+        proposal.c_rnd = new_rnd
+        proposal.c_val = value
         
-        logger.debug(f"[{id}] Starting Phase 1 for instance {instance} with c_rnd {new_rnd}")
+        if debug:
+            logger.debug("[%s] Starting Phase 1 for instance %s with c_rnd %s", id, instance, new_rnd)
         phase1a = create_phase1a_message(c_rnd=new_rnd, instance=instance, client_id=id)
-        s.sendto(phase1a, config["acceptors"])
-        pending[instance] = time.time()
-        promises[instance].clear()
-        accepts[instance].clear()
+        queue_acceptors(phase1a)
+        proposal.deadline = now + random.uniform(1, 3)
+        heapq.heappush(retry_heap, (proposal.deadline, instance))
+        proposal.reset_promises()
+        proposal.accepted = 0
     
-    while True:
-        try:
-            data = r.recv(2**16)
-            msg = json.loads(data.decode())
-            msg_type = msg["type"]
+    def propose_next(value):
+        nonlocal next_instance
+        # Use next available instance
+        instance = next_instance
+        next_instance += 1
+        start_phase1(instance, value)
+    
+    def handle_propose(data):
+        value, client_id = parse_propose_message(data)
+        if len(proposals) < MAX_PIPELINE_DEPTH:
+            propose_next(value)
+        else:
+            backlog.append(value)
+    
+    def handle_phase1b(data):
+        msg_rnd, v_rnd, v_val, instance, _, acceptor_id = parse_phase1b_message(data)
+        acceptor_bit = 1 << acceptor_id
+        
+        proposal = proposals.get(instance)
+        # Promises arriving after the quorum was reached, or repeated, are ignored
+        if (proposal is not None and msg_rnd == proposal.c_rnd and not proposal.phase1_done
+                and not proposal.promised & acceptor_bit):
+            proposal.promised |= acceptor_bit
+            if v_rnd is not None and (proposal.best_rnd is None or v_rnd > proposal.best_rnd):
+                proposal.best_rnd, proposal.best_val = v_rnd, v_val
             
-            if msg_type == "PROPOSE":
-                value = msg["value"]
-                client_id = msg["client_id"]
-                # Use next available instance
-                instance = next_instance
-                next_instance += 1
-                start_phase1(instance, value)
+            if bin(proposal.promised).count("1") >= QUORUM_SIZE:
+                proposal.phase1_done = True
+                # Adopt the value accepted in the highest round, if any
+                if proposal.best_rnd is not None:
+                    proposal.c_val = proposal.best_val
+                
+                if debug:
+                    logger.debug("[%s] instance %s Received sufficient PHASE1B, proposing value: %s", id, instance, proposal.c_val)
+                phase2a = create_phase2a_message(
+                    c_rnd=proposal.c_rnd,
+                    c_val=proposal.c_val,
+                    instance=instance,
+                    client_id=id
+                )
+                queue_acceptors(phase2a)
+    
+    def handle_phase2b(data):
+        msg_v_rnd, _, instance, _, acceptor_id = parse_phase2b_message(data)
+        acceptor_bit = 1 << acceptor_id
+        
+        proposal = proposals.get(instance)
+        if proposal is not None and msg_v_rnd == proposal.c_rnd and not proposal.accepted & acceptor_bit:
+            proposal.accepted |= acceptor_bit
             
-            elif msg_type == "PHASE1B":
-                instance = msg["slot"]
-                msg_rnd = (msg["rnd_1"], msg["rnd_2"])
+            if bin(proposal.accepted).count("1") >= QUORUM_SIZE:
+                # Send decision to learners, and to acceptors so they can serve catch-up
+                decision = create_decision_message(proposal.c_val, instance)
+                queue_learners(decision)
+                queue_acceptors(decision)
                 
-                if instance in c_rnd and msg_rnd == c_rnd[instance]:
-                    promises[instance].append({
-                        "v_rnd": (msg["v_rnd_1"], msg["v_rnd_2"]) if msg["v_rnd_1"] is not None else None,
-                        "v_val": msg["v_val"]
-                    })
-                    
-                    if len(promises[instance]) >= QUORUM_SIZE:
-                        # Find highest round among promises
-                        valid_promises = [p for p in promises[instance] if p["v_rnd"] is not None]
-                        if valid_promises:
-                            highest_promise = max(valid_promises, key=lambda p: p["v_rnd"])
-                            c_val[instance] = highest_promise["v_val"]
-                        
-                        logger.debug(f"[{id}] instance {instance} Received sufficient PHASE1B, proposing value: {c_val[instance]}")
-                        phase2a = create_phase2a_message(
-                            c_rnd=c_rnd[instance],
-                            c_val=c_val[instance],
-                            instance=instance,
-                            client_id=id
-                        )
-                        s.sendto(phase2a, config["acceptors"])
-
-            elif msg_type == "PHASE2B":
-                instance = msg["slot"]
-                msg_v_rnd = (msg["v_rnd_1"], msg["v_rnd_2"])
-                value = msg["v_val"]
+                # Cleanup state for this instance and hand its slot to the next value
+                del proposals[instance]
+                if backlog:
+                    propose_next(backlog.popleft())
+    
+    handlers = dispatch_table({
+        PROPOSE: handle_propose,
+        PHASE1B: handle_phase1b,
+        PHASE2B: handle_phase2b
+    })
+    
+    while True:
+        # Sleep until a datagram arrives or the earliest retry deadline passes
+        timeout = max(0.0, retry_heap[0][0] - time.monotonic()) if retry_heap else None
+        try:
+            ready = selector.select(timeout)
+            now = time.monotonic()
+            try:
+                if ready:
+                    for data in unbundle(drain(r)):
+                        dispatch(handlers, data, logger)
                 
-                if instance in c_rnd and msg_v_rnd == c_rnd[instance]:
-                    accepts[instance].append(value)
-                    
-                    if len(accepts[instance]) >= QUORUM_SIZE:
-                        # Send decision to learners
-                        decision = create_decision_message(c_val[instance], instance)
-                        s.sendto(decision, config["learners"])
-                        
-                        # Cleanup state for this instance
-                        del pending[instance]
-                        del c_rnd[instance]
-                        del c_val[instance]
-                        promises[instance].clear()
-                        accepts[instance].clear()
+                # Retry Phase 1 for instances whose deadline passed; entries for decided
+                # or already rescheduled instances are stale and skipped
+                while retry_heap and retry_heap[0][0] <= now:
+                    deadline, instance = heapq.heappop(retry_heap)
+                    proposal = proposals.get(instance)
+                    if proposal is not None and proposal.deadline == deadline:
+                        start_phase1(instance, proposal.c_val)
+            
+            finally:
+                # Messages queued so far go out even if the iteration was cut short
+                to_acceptors_out = create_bundles(to_acceptors)
+                to_learners_out = create_bundles(to_learners)
+                to_acceptors.clear()
+                to_learners.clear()
+                send_batch(s_acceptors, to_acceptors_out)
+                send_batch(s_learners, to_learners_out)
         
         except BlockingIOError:
-            # Handle timeouts and retries
-            now = time.time()
-            for instance in list(pending.keys()):
-                elapsed_time = now - pending[instance]
-                if elapsed_time > random.randint(1, 3):
-                    start_phase1(instance, c_val[instance])
+            pass  # spurious wakeup, nothing queued after all
         
         except Exception as e:
             logger.error(f"Error: {e}", exc_info=True)
\ No newline at end of file
@@ -24,25 +24,25 @@ echo "Generating test values..."
 ./generate.sh "$n" > prop2
 
 echo "starting acceptors..."
-PYTHONPATH="$PAXOS_DIR" python3 "$PAXOS_DIR/paxos/main.py" "$conf" acceptor 1 &
-PYTHONPATH="$PAXOS_DIR" python3 "$PAXOS_DIR/paxos/main.py" "$conf" acceptor 2 &
-PYTHONPATH="$PAXOS_DIR" python3 "$PAXOS_DIR/paxos/main.py" "$conf" acceptor 3 &
+PYTHONPATH="$PAXOS_DIR" "${PYTHON:-python3}" "$PAXOS_DIR/paxos/main.py" "$conf" acceptor 1 &
+PYTHONPATH="$PAXOS_DIR" "${PYTHON:-python3}" "$PAXOS_DIR/paxos/main.py" "$conf" acceptor 2 &
+PYTHONPATH="$PAXOS_DIR" "${PYTHON:-python3}" "$PAXOS_DIR/paxos/main.py" "$conf" acceptor 3 &
 
 sleep 1
 echo "starting learners..."
-PYTHONPATH="$PAXOS_DIR" python3 "$PAXOS_DIR/paxos/main.py" "$conf" learner 1 > learn1 &
-PYTHONPATH="$PAXOS_DIR" python3 "$PAXOS_DIR/paxos/main.py" "$conf" learner 2 > learn2 &
+PYTHONPATH="$PAXOS_DIR" "${PYTHON:-python3}" "$PAXOS_DIR/paxos/main.py" "$conf" learner 1 > learn1 &
+PYTHONPATH="$PAXOS_DIR" "${PYTHON:-python3}" "$PAXOS_DIR/paxos/main.py" "$conf" learner 2 > learn2 &
 
 sleep 1
 echo "starting proposers..."
-PYTHONPATH="$PAXOS_DIR" python3 "$PAXOS_DIR/paxos/main.py" "$conf" proposer 1 &
-PYTHONPATH="$PAXOS_DIR" python3 "$PAXOS_DIR/paxos/main.py" "$conf" proposer 2 &
+PYTHONPATH="$PAXOS_DIR" "${PYTHON:-python3}" "$PAXOS_DIR/paxos/main.py" "$conf" proposer 1 &
+PYTHONPATH="$PAXOS_DIR" "${PYTHON:-python3}" "$PAXOS_DIR/paxos/main.py" "$conf" proposer 2 &
 
 echo "waiting to start clients"
 sleep 10
 echo "starting clients..."
-PYTHONPATH="$PAXOS_DIR" python3 "$PAXOS_DIR/paxos/main.py" "$conf" client 1 < prop1 &
-PYTHONPATH="$PAXOS_DIR" python3 "$PAXOS_DIR/paxos/main.py" "$conf" client 2 < prop2 &
+PYTHONPATH="$PAXOS_DIR" "${PYTHON:-python3}" "$PAXOS_DIR/paxos/main.py" "$conf" client 1 < prop1 &
+PYTHONPATH="$PAXOS_DIR" "${PYTHON:-python3}" "$PAXOS_DIR/paxos/main.py" "$conf" client 2 < prop2 &
 
 sleep 10
 